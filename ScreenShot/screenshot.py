@@ -4,13 +4,23 @@ import ctypes
 import threading
 import tkinter as tk
 from tkinter import messagebox
-from PIL import ImageGrab, ImageTk
+from PIL import Image, ImageGrab, ImageTk
 from ctypes import wintypes
 
+try:
+    import mss  # fast GDI BitBlt capture; falls back to ImageGrab if missing
+except ImportError:
+    mss = None
+
 # ========= Config =========
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 SAVE_DIR = os.path.join(SCRIPT_DIR, "images")
-STIPPLE_PATTERN = "gray25"  # gray12 (lighter) / gray50 (darker)
+SAVE_FORMAT = "PNG"  # "PNG" (fast deflate) or "BMP" (uncompressed, fastest to write)
+SAVE_OPTIONS = {
+    "PNG": {"compress_level": 1, "optimize": False},  # ~4x faster than default level 6
+    "BMP": {},
+}
+DIM_ALPHA = 64  # darkening outside the selection: 0 (none) .. 255 (black); 64 ~ old gray25 stipple
 
 # Hotkeys (global) — we’ll try multiple variants for “/”
 MOD_NOREPEAT = 0x4000
@@ -48,11 +58,68 @@ def ensure_save_dir():
 def timestamp_name():
     return time.strftime("%Y%m%d_%H%M%S")
 
-def grab_fullscreen():
+def capture_paths(save_dir):
+    stamp, ext = timestamp_name(), SAVE_FORMAT.lower()
+    yield os.path.join(save_dir, f"capture_{stamp}.{ext}")
+    counter = 1
+    while True:
+        yield os.path.join(save_dir, f"capture_{stamp}_{counter:03d}.{ext}")
+        counter += 1
+
+def create_capture_file(save_dir):
+    # Claim the name atomically: one open() per candidate, no stat() race
+    flags = os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, "O_BINARY", 0)
+    for path in capture_paths(save_dir):
+        try:
+            return path, os.open(path, flags)
+        except FileExistsError:
+            pass
+
+def virtual_rect():
+    # Bounding box of all monitors, read fresh each call: mss caches its
+    # monitor list per instance, so it misses resolution/monitor changes
+    try:
+        metric = ctypes.windll.user32.GetSystemMetrics
+        return {"left": metric(76), "top": metric(77),        # SM_X/YVIRTUALSCREEN
+                "width": metric(78), "height": metric(79)}    # SM_CX/CYVIRTUALSCREEN
+    except Exception:
+        return None
+
+def grab_fullscreen(sct=None, rect=None):
+    if sct is not None:
+        rect = rect or virtual_rect() or sct.monitors[0]  # monitor 0 = all monitors
+        return grab_region(sct, rect)
     try:
-        return ImageGrab.grab(all_screens=True)
+        img = ImageGrab.grab(all_screens=True)
     except TypeError:
-        return ImageGrab.grab()
+        img = ImageGrab.grab()
+    # Overlay photo and captures are RGB; only convert if the backend differs
+    return img if img.mode == "RGB" else img.convert("RGB")
+
+def virtual_origin(rect=None):
+    # Screen position of bg_img pixel (0,0), i.e. the virtual desktop's top-left
+    rect = rect or virtual_rect()
+    return (rect["left"], rect["top"]) if rect else (0, 0)
+
+def grab_region(sct, region):
+    # Decode straight from mss's raw BGRA buffer (shot.bgra is a bytes() copy of it).
+    # ImageTk still copies this into a single-block image before Tk_PhotoPutBlock,
+    # since Pillow keeps frames this size in chunked storage.
+    shot = sct.grab(region)
+    return Image.frombuffer("RGB", shot.size, shot.raw, "raw", "BGRX", 0, 1)
+
+def wait_for_compositor():
+    # Block until DWM has composed the next frame (one vsync)
+    try:
+        if ctypes.windll.dwmapi.DwmFlush() == 0:  # S_OK
+            return
+    except Exception:
+        pass
+    time.sleep(0.016)  # DWM off/unavailable: roughly one 60 Hz frame
+
+def dim_layer(size):
+    # Solid translucent black; independent of the desktop, so built once per resolution
+    return ImageTk.PhotoImage(Image.new("RGBA", size, (0, 0, 0, DIM_ALPHA)))
 
 def combo_to_text(vk, mod):
     names = []
@@ -74,9 +141,11 @@ class HotkeyThread(threading.Thread):
         self.on_hide = on_hide
         self.tk_root = tk_root
         self.registered_ids = []  # list of (id, vk, mod)
+        self.native_tid = None    # Win32 thread id, target for WM_QUIT
 
     def run(self):
         user32 = ctypes.windll.user32
+        self.native_tid = ctypes.windll.kernel32.GetCurrentThreadId()
 
         # Register overlay show/hide first
         user32.RegisterHotKey(None, 1002, MOD_NOREPEAT, VK_F7)  # show
@@ -114,6 +183,7 @@ class HotkeyThread(threading.Thread):
                         if hotkey_id == rid:
                             self.tk_root.after(0, self.on_capture)
                             break
+                continue  # fully handled; nothing to translate or dispatch
 
             user32.TranslateMessage(ctypes.byref(msg))
             user32.DispatchMessageW(ctypes.byref(msg))
@@ -141,26 +211,38 @@ class SnippingTool:
         self.root.attributes('-topmost', True)
         self.root.overrideredirect(True)
 
+        # One mss instance for the app's lifetime: it keeps its DC and DIB
+        # between grabs (None -> ImageGrab fallback)
+        self._sct = mss.mss() if mss is not None else None
+
         # Prepare background and size
-        self.bg_img = grab_fullscreen()
+        rect = virtual_rect()
+        self.bg_img = grab_fullscreen(self._sct, rect)
         self.W, self.H = self.bg_img.size
-        self.root.geometry(f"{self.W}x{self.H}+0+0")
+        # Canvas (0,0) sits on the virtual desktop origin, like bg_img
+        self.ox, self.oy = virtual_origin(rect)
+        self.root.geometry(f"{self.W}x{self.H}+{self.ox}+{self.oy}")
 
         self.canvas = tk.Canvas(self.root, width=self.W, height=self.H, highlightthickness=0, bd=0)
         self.canvas.pack(fill="both", expand=True)
+        # Raw Tcl entry point for hot paths (skips Canvas.coords arg handling)
+        self._tkcall = self.canvas.tk.call
+        self._cpath = str(self.canvas)
         self.root.configure(cursor="tcross")
 
         self.tk_bg = ImageTk.PhotoImage(self.bg_img)
         self.bg_item = self.canvas.create_image(0, 0, image=self.tk_bg, anchor="nw")
+        self._create_mask()
 
         # Initial rectangle (centered)
         margin = min(self.W, self.H) // 6
-        self.x1, self.y1 = margin, margin
-        self.x2, self.y2 = self.W - margin, self.H - margin
+        self._set_rect(margin, margin, self.W - margin, self.H - margin)
 
         self.rect = self.canvas.create_rectangle(self.x1, self.y1, self.x2, self.y2,
                                                  outline="#00e0ff", width=2)
         self.handles = {}
+        self._last_rect = None     # last rect drawn by update_handles
+        self._last_overlay = None  # last rect drawn by update_overlay
         self._create_handles()
         self.update_overlay()
 
@@ -169,6 +251,9 @@ class SnippingTool:
         self.start_x = 0
         self.start_y = 0
         self.orig = None
+        self._redraw_pending = False
+        self._current_cursor = None
+        self._closing = False
 
         # Bindings (when overlay visible)
         self.canvas.bind("<Motion>", self.on_motion)
@@ -178,13 +263,13 @@ class SnippingTool:
         self.root.bind("<Escape>", lambda e: self.quit_app())
 
         # Global hotkeys
-        hk = HotkeyThread(
+        self.hk = HotkeyThread(
             on_capture=self.capture_now,
             on_show=self.show_overlay,
             on_hide=self.hide_overlay,
             tk_root=self.root
         )
-        hk.start()
+        self.hk.start()
 
         print("Hotkeys:")
         print("  F7  -> show overlay")
@@ -196,13 +281,31 @@ class SnippingTool:
 
     # ---- Overlay control ----
     def show_overlay(self):
-        # Refresh background and geometry to current desktop
-        self.bg_img = grab_fullscreen()
-        self.W, self.H = self.bg_img.size
-        self.root.geometry(f"{self.W}x{self.H}+0+0")
-        self.tk_bg = ImageTk.PhotoImage(self.bg_img)
-        self.canvas.itemconfigure(self.bg_item, image=self.tk_bg)
-
+        # Refresh background and geometry to current desktop. bg_img is also
+        # what visible captures crop from, so it must not contain the overlay.
+        if self.root.state() == 'normal':
+            self._hide_for_grab()
+        # One fresh read of the layout drives the grab, size and placement
+        rect = virtual_rect()
+        self.bg_img = grab_fullscreen(self._sct, rect)
+        origin = virtual_origin(rect)
+        if origin != (self.ox, self.oy) or self.bg_img.size != (self.W, self.H):
+            self.ox, self.oy = origin
+            self.root.geometry(f"{self.bg_img.width}x{self.bg_img.height}+{self.ox}+{self.oy}")
+        if self.bg_img.size == (self.W, self.H):
+            # Same resolution: overwrite the existing Tk photo in place
+            self.tk_bg.paste(self.bg_img)
+        else:
+            self.W, self.H = self.bg_img.size
+            self.canvas.configure(width=self.W, height=self.H)
+            self.tk_bg = ImageTk.PhotoImage(self.bg_img)
+            self.canvas.itemconfigure(self.bg_item, image=self.tk_bg)
+            self.tk_dim = dim_layer((self.W, self.H))
+            for it in self.mask_items[:2]:
+                self.canvas.itemconfigure(it, image=self.tk_dim)
+            self._side_h = None
+            self._mask_parked = False
+            self._last_overlay = None  # screen size changed, re-place the mask
         self.update_handles()
         self.update_overlay()
         self.root.deiconify()
@@ -213,20 +316,46 @@ class SnippingTool:
         self.root.withdraw()
 
     def quit_app(self):
+        self._closing = True  # save workers finish their file but skip Tk
         try:
-            ctypes.windll.user32.PostQuitMessage(0)  # stop hotkey loop
+            # PostQuitMessage would target the Tk thread; post to the hotkey thread
+            if self.hk.native_tid:
+                ctypes.windll.user32.PostThreadMessageW(self.hk.native_tid, 0x0012, 0, 0)  # WM_QUIT
         except Exception:
             pass
+        if self._sct is not None:
+            self._sct.close()  # release the cached DC/bitmap
         self.root.destroy()
 
     # ---- Rectangle + Handles ----
+    def _create_mask(self):
+        # Four dim bands around the selection, created once; update_overlay
+        # only moves them. Top/bottom show the full-screen dim photo anchored
+        # at the selection edge. Left/right share a full-width photo cut to
+        # the selection height, so no two bands overlap.
+        self.tk_dim = dim_layer((self.W, self.H))
+        self.tk_side = tk.PhotoImage(master=self.root)
+        self._side_name = str(self.tk_side)
+        self._side_h = None         # height tk_side is currently cut to
+        self._mask_parked = False   # True while the top band covers everything
+        self.mask_items = [
+            self.canvas.create_image(0, 0, image=self.tk_dim, anchor="sw"),   # top
+            self.canvas.create_image(0, 0, image=self.tk_dim, anchor="nw"),   # bottom
+            self.canvas.create_image(0, 0, image=self.tk_side, anchor="ne"),  # left
+            self.canvas.create_image(0, 0, image=self.tk_side, anchor="nw"),  # right
+        ]
+
     def _create_handles(self):
         for key in ["nw", "n", "ne", "e", "se", "s", "sw", "w"]:
             self.handles[key] = self.canvas.create_rectangle(0,0,0,0, fill="#00e0ff", outline="#00e0ff")
         self.update_handles()
 
     def update_handles(self):
-        x1, y1, x2, y2 = self._norm_rect(self.x1, self.y1, self.x2, self.y2)
+        r = self._nrect
+        if r == self._last_rect:
+            return
+        self._last_rect = r
+        x1, y1, x2, y2 = r
         cx = (x1 + x2) // 2
         cy = (y1 + y2) // 2
         hs = self.HANDLE_SIZE
@@ -241,33 +370,56 @@ class SnippingTool:
             "sw": box(x1, y2),
             "w" : box(x1, cy),
         }
+        tkcall, cp, handles = self._tkcall, self._cpath, self.handles
         for k, r in coords.items():
-            self.canvas.coords(self.handles[k], *r)
-        self.canvas.coords(self.rect, x1, y1, x2, y2)
+            tkcall(cp, "coords", handles[k], r[0], r[1], r[2], r[3])
+        tkcall(cp, "coords", self.rect, x1, y1, x2, y2)
 
     def update_overlay(self):
-        x1, y1, x2, y2 = self._norm_rect(self.x1, self.y1, self.x2, self.y2)
-        if hasattr(self, 'mask_items'):
-            for it in self.mask_items:
-                self.canvas.delete(it)
-        self.mask_items = []
-        fill = "black"
-        stip = STIPPLE_PATTERN
-        self.mask_items.append(self.canvas.create_rectangle(0, 0, self.W, y1, fill=fill, stipple=stip, outline=""))
-        self.mask_items.append(self.canvas.create_rectangle(0, y2, self.W, self.H, fill=fill, stipple=stip, outline=""))
-        self.mask_items.append(self.canvas.create_rectangle(0, y1, x1, y2, fill=fill, stipple=stip, outline=""))
-        self.mask_items.append(self.canvas.create_rectangle(x2, y1, self.W, y2, fill=fill, stipple=stip, outline=""))
+        r = self._nrect
+        if r == self._last_overlay:
+            return
+        self._last_overlay = r
+        x1, y1, x2, y2 = r
+        tkcall, cp, W, H = self._tkcall, self._cpath, self.W, self.H
+        top, bottom, left, right = self.mask_items
+        if x2 - x1 < self.MIN_W or y2 - y1 < self.MIN_H:
+            # Too small to capture (e.g. start of a "new" drag): the top band
+            # covers the whole screen, the others are parked off-screen
+            if not self._mask_parked:
+                self._mask_parked = True
+                tkcall(cp, "coords", top, 0, H)
+                tkcall(cp, "coords", bottom, 0, H)
+                tkcall(cp, "coords", left, 0, 0)
+                tkcall(cp, "coords", right, W, 0)
+            return
+        self._mask_parked = False
+        h = y2 - y1
+        if h != self._side_h:
+            # Re-cut the side bands only when the selection height changes
+            self._side_h = h
+            tkcall(self._side_name, "copy", str(self.tk_dim), "-from", 0, 0, W, h,
+                   "-shrink", "-compositingrule", "set")
+        tkcall(cp, "coords", top, 0, y1)
+        tkcall(cp, "coords", bottom, 0, y2)
+        tkcall(cp, "coords", left, x1, y1)
+        tkcall(cp, "coords", right, x2, y1)
 
     # ---- Hit testing ----
     def _norm_rect(self, x1, y1, x2, y2):
         return (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
 
+    def _set_rect(self, x1, y1, x2, y2):
+        # Single writer for the selection; keeps the normalized copy in sync
+        self.x1, self.y1, self.x2, self.y2 = x1, y1, x2, y2
+        self._nrect = self._norm_rect(x1, y1, x2, y2)
+
     def _point_in_rect(self, x, y):
-        x1, y1, x2, y2 = self._norm_rect(self.x1, self.y1, self.x2, self.y2)
+        x1, y1, x2, y2 = self._nrect
         return x1 <= x <= x2 and y1 <= y <= y2
 
     def _edge_hit(self, x, y):
-        x1, y1, x2, y2 = self._norm_rect(self.x1, self.y1, self.x2, self.y2)
+        x1, y1, x2, y2 = self._nrect
         tol = self.EDGE_TOL
         near_left   = abs(x - x1) <= tol
         near_right  = abs(x - x2) <= tol
@@ -300,12 +452,12 @@ class SnippingTool:
     # ---- Events (when overlay visible) ----
     def on_motion(self, event):
         where = self._edge_hit(event.x, event.y)
-        if where:
-            self.canvas.configure(cursor=self._cursor_for(where))
-        elif self._point_in_rect(event.x, event.y):
-            self.canvas.configure(cursor=self._cursor_for("move"))
-        else:
-            self.canvas.configure(cursor=self._cursor_for(None))
+        if not where and self._point_in_rect(event.x, event.y):
+            where = "move"
+        cursor = self._cursor_for(where)
+        if cursor != self._current_cursor:  # only touch Tk when it changes
+            self._current_cursor = cursor
+            self.canvas.configure(cursor=cursor)
 
     def on_button1(self, event):
         where = self._edge_hit(event.x, event.y)
@@ -317,39 +469,45 @@ class SnippingTool:
             self.mode = "move"
         else:
             self.mode = "new"
-            self.x1 = self.x2 = event.x
-            self.y1 = self.y2 = event.y
+            self._set_rect(event.x, event.y, event.x, event.y)
             self.update_handles()
             self.update_overlay()
 
     def on_drag(self, event):
-        x = max(0, min(event.x, self.W))
-        y = max(0, min(event.y, self.H))
+        # Hot path: bind attributes to locals once per event
+        W, H, mode = self.W, self.H, self.mode
+        x = max(0, min(event.x, W))
+        y = max(0, min(event.y, H))
         ox1, oy1, ox2, oy2 = self.orig
 
-        if self.mode == "move":
-            dx, dy = x - self.start_x, y - self.start_y
-            nx1, ny1, nx2, ny2 = ox1 + dx, oy1 + dy, ox2 + dx, oy2 + dy
-            w = nx2 - nx1
-            h = ny2 - ny1
-            nx1 = max(0, min(nx1, self.W - w))
-            ny1 = max(0, min(ny1, self.H - h))
-            nx2, ny2 = nx1 + w, ny1 + h
-            self.x1, self.y1, self.x2, self.y2 = nx1, ny1, nx2, ny2
-
-        elif self.mode in ("n","s","e","w","ne","nw","se","sw"):
-            x1, y1, x2, y2 = ox1, oy1, ox2, oy2
-            if "n" in self.mode: y1 = min(y, y2 - self.MIN_H)
-            if "s" in self.mode: y2 = max(y, y1 + self.MIN_H)
-            if "w" in self.mode: x1 = min(x, x2 - self.MIN_W)
-            if "e" in self.mode: x2 = max(x, x1 + self.MIN_W)
-            x1, x2 = max(0, x1), min(self.W, x2)
-            y1, y2 = max(0, y1), min(self.H, y2)
-            self.x1, self.y1, self.x2, self.y2 = x1, y1, x2, y2
-
-        elif self.mode == "new":
-            self.x2, self.y2 = x, y
+        if mode == "move":
+            w = ox2 - ox1
+            h = oy2 - oy1
+            nx1 = max(0, min(ox1 + x - self.start_x, W - w))
+            ny1 = max(0, min(oy1 + y - self.start_y, H - h))
+            self._set_rect(nx1, ny1, nx1 + w, ny1 + h)
 
+        elif mode in ("n","s","e","w","ne","nw","se","sw"):
+            MIN_W, MIN_H = self.MIN_W, self.MIN_H
+            x1, y1, x2, y2 = ox1, oy1, ox2, oy2
+            if "n" in mode: y1 = min(y, y2 - MIN_H)
+            if "s" in mode: y2 = max(y, y1 + MIN_H)
+            if "w" in mode: x1 = min(x, x2 - MIN_W)
+            if "e" in mode: x2 = max(x, x1 + MIN_W)
+            x1, x2 = max(0, x1), min(W, x2)
+            y1, y2 = max(0, y1), min(H, y2)
+            self._set_rect(x1, y1, x2, y2)
+
+        elif mode == "new":
+            self._set_rect(self.x1, self.y1, x, y)
+
+        # Coalesce bursts of motion events into one redraw per idle tick
+        if not self._redraw_pending:
+            self._redraw_pending = True
+            self.root.after_idle(self._flush_redraw)
+
+    def _flush_redraw(self):
+        self._redraw_pending = False
         self.update_handles()
         self.update_overlay()
 
@@ -359,7 +517,7 @@ class SnippingTool:
 
     # ---- Capture (callable from global hotkey) ----
     def capture_now(self):
-        x1, y1, x2, y2 = map(int, self._norm_rect(self.x1, self.y1, self.x2, self.y2))
+        x1, y1, x2, y2 = map(int, self._nrect)
         if x2 - x1 < self.MIN_W or y2 - y1 < self.MIN_H:
             try:
                 if self.root.state() == 'normal':
@@ -368,40 +526,72 @@ class SnippingTool:
                 pass
             return
 
-        # Hide overlay to avoid borders in the image
         was_visible = (self.root.state() == 'normal')
+        if was_visible:
+            # The overlay has covered the desktop since bg_img was grabbed,
+            # so it is exactly what the user is selecting from
+            img = self.bg_img.crop((x1, y1, x2, y2))
+        else:
+            img = self._grab_selection(x1, y1, x2, y2)
+
+        path, fd = create_capture_file(ensure_save_dir())
+
+        # Encode off the Tk thread so the overlay comes back immediately.
+        # Not a daemon: interpreter exit waits for the file to be complete.
+        threading.Thread(target=self._save_capture, args=(img, path, fd, was_visible)).start()
+
+    def _hide_for_grab(self):
+        # Hide overlay to avoid borders in the image
         try:
             self.root.withdraw()
             self.root.update_idletasks()
-            time.sleep(0.12)  # let the OS repaint
+            self.root.update()
+            wait_for_compositor()  # overlay frame is gone from the screen
         except Exception:
             pass
 
-        # Capture the bbox directly
+    def _grab_selection(self, x1, y1, x2, y2):
+        # Overlay is hidden; capture the bbox directly (canvas -> screen coords)
+        ox, oy = self.ox, self.oy
+        if self._sct is not None:
+            return grab_region(self._sct, {"left": ox + x1, "top": oy + y1,
+                                           "width": x2 - x1, "height": y2 - y1})
         try:
-            img = ImageGrab.grab(bbox=(x1, y1, x2, y2), all_screens=True)  # Pillow ≥ 9.2
+            return ImageGrab.grab(bbox=(ox + x1, oy + y1, ox + x2, oy + y2),
+                                  all_screens=True)  # Pillow ≥ 9.2
         except TypeError:
             full = grab_fullscreen()
-            img = full.crop((x1, y1, x2, y2))
-
-        save_dir = ensure_save_dir()
-        base = f"capture_{timestamp_name()}.png"
-        path = os.path.join(save_dir, base)
-        counter = 1
-        while os.path.exists(path):
-            path = os.path.join(save_dir, f"capture_{timestamp_name()}_{counter:03d}.png")
-            counter += 1
-        img.save(path)
-
-        # Restore overlay if it was visible before
-        if was_visible:
+            return full.crop((x1, y1, x2, y2))
+
+    def _save_capture(self, img, path, fd, notify):
+        # Runs on a worker thread; screenshots are throwaway, favour speed
+        try:
+            with os.fdopen(fd, "wb") as f:
+                img.save(f, SAVE_FORMAT, **SAVE_OPTIONS[SAVE_FORMAT])
+        except Exception as e:
+            print(f"[Capture] Could not save {path}: {e}")
             try:
-                self.root.deiconify()
-                self.root.lift()
-                self.root.attributes('-topmost', True)
-                messagebox.showinfo("Saved", f"Saved to:\n{path}")
+                os.unlink(path)  # don't leave an empty/truncated file behind
+            except OSError:
+                pass
+            self._notify(messagebox.showerror, "Save failed", f"Could not save:\n{path}\n\n{e}")
+            return
+        if notify:
+            self._notify(messagebox.showinfo, "Saved", f"Saved to:\n{path}")
+
+    def _notify(self, show, title, text):
+        # Marshal a message box from a save worker onto the Tk thread
+        if self._closing:
+            return
+        def run():
+            try:
+                show(title, text)
             except Exception:
                 pass
+        try:
+            self.root.after(0, run)
+        except Exception:
+            pass  # Tk already gone (quit while saving)
 
 if __name__ == "__main__":
     SnippingTool()